@@ -7,16 +7,35 @@ Handles bot detection, approval system, and comprehensive moderation actions
 """
 
 import asyncio
+import heapq
 import logging
+import time
 import discord
 from discord.ext import commands
 from datetime import datetime, timezone
-from typing import Dict, Set
-from config import BotConfig
-from utils import is_moderator, send_safe_dm, format_countdown
+from typing import Dict, List, Set, Tuple
+from config import BotConfig, APPROVAL_TIMEOUT, TARGET_ROLE_ID
+from utils import is_moderator, clear_moderator_cache, send_safe_dm, format_countdown
 from database import db
 
+# Reactions that approve/reject a pending bot
+APPROVE_EMOJI = "✅"
+REJECT_EMOJI = "❌"
+_APPROVAL_EMOJIS = frozenset((APPROVE_EMOJI, REJECT_EMOJI))
+
 class SecurityBot(commands.Bot):
+    # Static parts of the approval request embed sent in notify_moderators
+    _NOTIFY_TEMPLATE = {
+        'type': 'rich',
+        'title': "🚨 New Bot Detected",
+        'color': discord.Color.orange().value
+    }
+    _NOTIFY_ACTIONS_FIELD = {
+        'name': "Actions",
+        'value': f"React with {APPROVE_EMOJI} to approve or {REJECT_EMOJI} to reject\n⏰ **Auto-reject in {BotConfig.APPROVAL_TIMEOUT} seconds**",
+        'inline': False
+    }
+    
     def __init__(self):
         # Configure bot intents
         intents = discord.Intents.default()
@@ -30,17 +49,34 @@ class SecurityBot(commands.Bot):
         )
         
         self.logger = logging.getLogger(__name__)
-        self.pending_bots: Dict[int, Dict] = {}  # bot_id -> {guild_id, task, moderators_notified}
-        self.approved_bots: Set[int] = set()  # Set of approved bot IDs
-        
+        self.pending_bots: Dict[int, Dict] = {}  # bot_id -> {guild_id, deadline, moderators_notified, message_ids}
+        self.approved_bots: Set[Tuple[int, int]] = set()  # (guild_id, bot_id) approvals; approval is per guild
+        self._msg_to_bot: Dict[int, int] = {}  # approval DM message_id -> bot_id
+        self._moderators_cache: Dict[int, Tuple[float, List[discord.Member]]] = {}  # guild_id -> (built_at, moderators)
+        self._expiry_heap: List[Tuple[float, int]] = []  # (monotonic deadline, bot_id) for pending bots
+        self._expiry_wakeup = asyncio.Event()
+        self._sweeper = None
+        self._stats_refresher = None
+        
+    async def setup_hook(self):
+        """Start the expiry sweeper before the gateway connects"""
+        # on_member_join can fire while on_ready is still awaiting, so the
+        # sweeper must not wait for on_ready (or depend on it succeeding)
+        if self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._expiry_sweeper())
+            
     async def on_ready(self):
         """Called when the bot is ready"""
-        self.logger.info(f'{self.user} has connected to Discord!')
-        self.logger.info(f'Bot is in {len(self.guilds)} guilds')
+        self.logger.info('%s has connected to Discord!', self.user)
+        self.logger.info('Bot is in %s guilds', len(self.guilds))
         
         # Initialize database
         await db.initialize()
         
+        # Restore approvals from previous runs (approvals are logged as they happen)
+        self.approved_bots.update(await db.get_approved_bots())
+        self.logger.info('Loaded %s previous bot approvals', len(self.approved_bots))
+        
         # Set bot status with creator attribution
         activity = discord.Activity(
             type=discord.ActivityType.watching,
@@ -51,214 +87,274 @@ class SecurityBot(commands.Bot):
         # Log startup message with branding
         self.logger.info("Discord Security Bot v2.0 by spice.efx - Fully operational!")
         
+        # Start background workers (on_ready can fire again on reconnect)
+        if self._stats_refresher is None:
+            self._stats_refresher = asyncio.create_task(self._stats_refresh_loop())
+            
+    async def close(self):
+        """Stop background workers and flush queued action logs before shutting down"""
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            self._sweeper = None
+            
+        if self._stats_refresher is not None:
+            self._stats_refresher.cancel()
+            self._stats_refresher = None
+            
+        # Flush queued action logs and release the pool
+        await db.close()
+        
+        await super().close()
+        
+    async def _stats_refresh_loop(self):
+        """Periodically refresh the lifetime stats materialized view"""
+        while True:
+            # Refresh first so the view is current right after startup
+            await db.refresh_stats()
+            await asyncio.sleep(BotConfig.STATS_REFRESH_INTERVAL)
+        
     async def on_member_join(self, member):
         """Handle new member joins - detect and process bot additions"""
         if not member.bot:
             return  # Not a bot, ignore
             
         guild = member.guild
-        self.logger.info(f"Bot detected joining {guild.name}: {member.name} (ID: {member.id})")
+        self.logger.info("Bot detected joining %s: %s (ID: %s)", guild.name, member.name, member.id)
         
         # Check if bot is already approved
-        if member.id in self.approved_bots:
-            self.logger.info(f"Bot {member.name} (ID: {member.id}) is pre-approved")
+        if (member.guild.id, member.id) in self.approved_bots:
+            self.logger.info("Bot %s (ID: %s) is pre-approved", member.name, member.id)
             return
             
+        # Take the event time once and share it with everything below
+        now = datetime.now(timezone.utc)
+        
+        # Look up the inviter once; it is cached in pending_bots for later actions
+        inviter = await self._fetch_inviter(member)
+        
         # Log bot detection
-        await self.log_bot_detection(member)
+        await self.log_bot_detection(member, inviter=inviter, now=now)
         
         # Start approval process
-        await self.process_bot_addition(member)
+        await self.process_bot_addition(member, inviter=inviter, now=now)
         
-    async def process_bot_addition(self, bot_member):
+    async def on_member_update(self, before, after):
+        """Invalidate cached moderator status when a member's roles change"""
+        if before.roles != after.roles:
+            clear_moderator_cache(after)
+            self._moderators_cache.pop(after.guild.id, None)
+            
+    async def on_member_remove(self, member):
+        """Invalidate the cached moderator list when a member leaves"""
+        self._moderators_cache.pop(member.guild.id, None)
+            
+    async def process_bot_addition(self, bot_member, inviter=None, now=None):
         """Process a new bot addition with approval system"""
+        if now is None:
+            now = datetime.now(timezone.utc)
         guild = bot_member.guild
         bot_id = bot_member.id
         
-        # Check if bot is already pending
-        if bot_id in self.pending_bots:
-            self.logger.warning(f"Bot {bot_member.name} is already pending approval")
+        # Store pending bot info, unless the bot is already pending. This runs
+        # before any await so concurrent joins for the same bot can't both pass.
+        entry = {
+            'guild_id': guild.id,
+            'member': bot_member,
+            'start_monotonic': time.monotonic(),
+            'moderators_notified': set(),
+            'message_ids': [],
+            'inviter': inviter
+        }
+        if self.pending_bots.setdefault(bot_id, entry) is not entry:
+            self.logger.warning("Bot %s is already pending approval", bot_member.name)
             return
             
         # Find moderators to notify
         moderators = await self.get_moderators(guild)
         if not moderators:
-            self.logger.warning(f"No moderators found in {guild.name} - auto-rejecting bot")
+            self.logger.warning("No moderators found in %s - auto-rejecting bot", guild.name)
             await self.reject_bot(bot_member, "No moderators available")
             return
             
-        # Store pending bot info
-        self.pending_bots[bot_id] = {
-            'guild_id': guild.id,
-            'member': bot_member,
-            'start_time': datetime.now(timezone.utc),
-            'moderators_notified': set()
-        }
-        
         # Notify moderators
-        await self.notify_moderators(bot_member, moderators)
+        await self.notify_moderators(bot_member, moderators, now=now)
         
-        # Start countdown timer
-        countdown_task = asyncio.create_task(self.countdown_timer(bot_member))
-        self.pending_bots[bot_id]['task'] = countdown_task
+        # Start countdown; _expiry_sweeper rejects the bot if it is still pending then
+        deadline = time.monotonic() + APPROVAL_TIMEOUT
+        entry['deadline'] = deadline
+        heapq.heappush(self._expiry_heap, (deadline, bot_id))
+        self._expiry_wakeup.set()
 
-    async def log_bot_detection(self, bot_member):
+    async def _fetch_inviter(self, bot_member):
+        """Get (inviter_id, inviter_name) for a bot from the guild audit log"""
+        try:
+            async for entry in bot_member.guild.audit_logs(action=discord.AuditLogAction.bot_add, limit=10):
+                if entry.target and entry.target.id == bot_member.id:
+                    return entry.user.id, entry.user.name
+        except discord.Forbidden:
+            pass  # No audit log access
+        return None, "Unknown"
+
+    async def _build_action_data(self, bot_member, action_type, *, moderator=None, reason=None, inviter=None, now=None):
+        """Build the bot_actions row for a bot event"""
+        if now is None:
+            now = datetime.now(timezone.utc)
+            
+        # Get who invited the bot, unless already known
+        if inviter is None:
+            inviter = await self._fetch_inviter(bot_member)
+        invited_by_id, invited_by_name = inviter
+        
+        # Calculate account age
+        account_age = (now - bot_member.created_at).days
+        
+        return {
+            'action_type': action_type,
+            'bot_id': bot_member.id,
+            'bot_name': bot_member.name,
+            'guild_id': bot_member.guild.id,
+            'guild_name': bot_member.guild.name,
+            'moderator_id': moderator.id if moderator else None,
+            'moderator_name': moderator.name if moderator else None,
+            'invited_by_id': invited_by_id,
+            'invited_by_name': invited_by_name,
+            'reason': reason or f'Bot {action_type}',
+            'bot_permissions': bot_member.guild_permissions.value,
+            'account_age_days': account_age
+        }
+
+    async def log_bot_detection(self, bot_member, inviter=None, now=None):
         """Log bot detection to database"""
         try:
-            # Get who invited the bot from audit logs
-            invited_by_id = None
-            invited_by_name = "Unknown"
-            
-            try:
-                async for entry in bot_member.guild.audit_logs(action=discord.AuditLogAction.bot_add, limit=10):
-                    if entry.target and entry.target.id == bot_member.id:
-                        invited_by_id = entry.user.id
-                        invited_by_name = entry.user.name
-                        break
-            except discord.Forbidden:
-                pass  # No audit log access
-            
-            # Calculate account age
-            account_age = (datetime.now(timezone.utc) - bot_member.created_at).days
-            
-            action_data = {
-                'action_type': 'detected',
-                'bot_id': bot_member.id,
-                'bot_name': bot_member.name,
-                'guild_id': bot_member.guild.id,
-                'guild_name': bot_member.guild.name,
-                'moderator_id': None,
-                'moderator_name': None,
-                'invited_by_id': invited_by_id,
-                'invited_by_name': invited_by_name,
-                'reason': 'Bot detected joining server',
-                'bot_permissions': bot_member.guild_permissions.value,
-                'account_age_days': account_age
-            }
-            
+            action_data = await self._build_action_data(
+                bot_member, 'detected', reason='Bot detected joining server', inviter=inviter, now=now
+            )
             await db.log_bot_action(action_data)
         except Exception as e:
-            self.logger.error(f"Failed to log bot detection: {e}")
+            self.logger.error("Failed to log bot detection: %s", e)
 
-    async def log_bot_action(self, bot_member, action_type, moderator=None, reason=None):
+    async def log_bot_action(self, bot_member, action_type, moderator=None, reason=None, inviter=None):
         """Log bot action to database"""
         try:
-            # Get who invited the bot from audit logs
-            invited_by_id = None
-            invited_by_name = "Unknown"
-            
-            try:
-                async for entry in bot_member.guild.audit_logs(action=discord.AuditLogAction.bot_add, limit=10):
-                    if entry.target and entry.target.id == bot_member.id:
-                        invited_by_id = entry.user.id
-                        invited_by_name = entry.user.name
-                        break
-            except discord.Forbidden:
-                pass  # No audit log access
-            
-            # Calculate account age
-            account_age = (datetime.now(timezone.utc) - bot_member.created_at).days
-            
-            action_data = {
-                'action_type': action_type,
-                'bot_id': bot_member.id,
-                'bot_name': bot_member.name,
-                'guild_id': bot_member.guild.id,
-                'guild_name': bot_member.guild.name,
-                'moderator_id': moderator.id if moderator else None,
-                'moderator_name': moderator.name if moderator else None,
-                'invited_by_id': invited_by_id,
-                'invited_by_name': invited_by_name,
-                'reason': reason or f'Bot {action_type}',
-                'bot_permissions': bot_member.guild_permissions.value,
-                'account_age_days': account_age
-            }
-            
+            action_data = await self._build_action_data(
+                bot_member, action_type, moderator=moderator, reason=reason, inviter=inviter
+            )
             await db.log_bot_action(action_data)
         except Exception as e:
-            self.logger.error(f"Failed to log bot action: {e}")
+            self.logger.error("Failed to log bot action: %s", e)
         
     async def get_moderators(self, guild):
-        """Get list of moderators in the guild"""
-        moderators = []
-        target_role_id = BotConfig.TARGET_ROLE_ID
+        """Get list of moderators in the guild (cached for 60 seconds)"""
+        now = time.monotonic()
+        cached = self._moderators_cache.get(guild.id)
+        if cached and now - cached[0] < 60:
+            return cached[1]
+            
+        target_role_id = TARGET_ROLE_ID
         
         # Find the specific role
         target_role = guild.get_role(target_role_id)
         if not target_role:
-            self.logger.warning(f"Target role ID {target_role_id} not found in guild {guild.name}")
-            return moderators
+            self.logger.warning("Target role ID %s not found in guild %s", target_role_id, guild.name)
+            return []
         
         # Get members with the specific role
-        for member in target_role.members:
-            if not member.bot:
-                moderators.append(member)
-                
+        moderators = [member for member in target_role.members if not member.bot]
+        self._moderators_cache[guild.id] = (now, moderators)
         return moderators
         
-    async def notify_moderators(self, bot_member, moderators):
+    async def notify_moderators(self, bot_member, moderators, now=None):
         """Send DM notifications to moderators about pending bot"""
         guild = bot_member.guild
-        bot_id = bot_member.id
-        
-        embed = discord.Embed(
-            title="🚨 New Bot Detected",
-            description=f"A new bot has joined **{guild.name}** and requires approval.",
-            color=discord.Color.orange(),
-            timestamp=datetime.now(timezone.utc)
-        )
-        
-        embed.add_field(
-            name="Bot Information",
-            value=f"**Name:** {bot_member.name}\n**ID:** {bot_member.id}\n**Account Created:** {bot_member.created_at.strftime('%Y-%m-%d %H:%M:%S UTC')}",
-            inline=False
-        )
         
-        embed.add_field(
-            name="Actions",
-            value=f"React with ✅ to approve or ❌ to reject\n⏰ **Auto-reject in {BotConfig.APPROVAL_TIMEOUT} seconds**",
-            inline=False
+        # Only the bot/guild specific parts are built per notification
+        bot_info = {
+            'name': "Bot Information",
+            'value': f"**Name:** {bot_member.name}\n**ID:** {bot_member.id}\n**Account Created:** {bot_member.created_at.strftime('%Y-%m-%d %H:%M:%S UTC')}",
+            'inline': False
+        }
+        embed = discord.Embed.from_dict({
+            **self._NOTIFY_TEMPLATE,
+            'description': f"A new bot has joined **{guild.name}** and requires approval.",
+            'fields': [bot_info, dict(self._NOTIFY_ACTIONS_FIELD)],  # from_dict keeps both list and dicts
+            'thumbnail': {'url': str(bot_member.display_avatar.url)},
+            'footer': {'text': f"Guild: {guild.name}"}
+        })
+        embed.timestamp = now or datetime.now(timezone.utc)
+        
+        # Send DMs to all moderators concurrently; one failure doesn't stop the rest
+        results = await asyncio.gather(
+            *(self._notify_one(moderator, embed, bot_member) for moderator in moderators),
+            return_exceptions=True
         )
         
-        embed.set_thumbnail(url=bot_member.display_avatar.url)
-        embed.set_footer(text=f"Guild: {guild.name}")
-        
-        # Send DMs to moderators
-        for moderator in moderators:
-            try:
-                dm_message = await send_safe_dm(moderator, embed=embed)
-                if dm_message:
-                    # Add reaction buttons
-                    await dm_message.add_reaction("✅")
-                    await dm_message.add_reaction("❌")
-                    
-                    self.pending_bots[bot_id]['moderators_notified'].add(moderator.id)
-                    self.logger.info(f"Notified moderator {moderator.name} about bot {bot_member.name}")
-                    
-            except Exception as e:
-                self.logger.error(f"Failed to notify moderator {moderator.name}: {e}")
-                
         # Log the notification
-        notified_count = len(self.pending_bots[bot_id]['moderators_notified'])
-        self.logger.info(f"Notified {notified_count}/{len(moderators)} moderators about bot {bot_member.name}")
-        
-    async def countdown_timer(self, bot_member):
-        """Handle countdown timer for bot approval"""
-        bot_id = bot_member.id
+        notified_count = sum(1 for result in results if result is True)
+        self.logger.info("Notified %s/%s moderators about bot %s", notified_count, len(moderators), bot_member.name)
         
+    async def _notify_one(self, moderator, embed, bot_member):
+        """Send the approval DM to a single moderator, returns True if delivered"""
         try:
-            # Wait for timeout period
-            await asyncio.sleep(BotConfig.APPROVAL_TIMEOUT)
-            
-            # Check if bot is still pending
-            if bot_id in self.pending_bots:
-                await self.reject_bot(bot_member, "Timeout - no approval received")
+            dm_message = await send_safe_dm(moderator, embed=embed)
+            if not dm_message:
+                return False
                 
-        except asyncio.CancelledError:
-            # Timer was cancelled (approval/rejection received)
-            pass
+            # Register the DM before reacting, so a quick reaction (or a failed
+            # add_reaction) still maps back to the pending bot. The bot may
+            # already have been approved/rejected by another moderator.
+            pending_info = self.pending_bots.get(bot_member.id)
+            if pending_info:
+                pending_info['moderators_notified'].add(moderator.id)
+                pending_info['message_ids'].append(dm_message.id)
+                self._msg_to_bot[dm_message.id] = bot_member.id
+                
+            # Add reaction buttons (sequential so ✅ always shows first)
+            await dm_message.add_reaction(APPROVE_EMOJI)
+            await dm_message.add_reaction(REJECT_EMOJI)
+            
+            if self.logger.isEnabledFor(logging.INFO):
+                self.logger.info("Notified moderator %s about bot %s", moderator.name, bot_member.name)
+            return True
+            
         except Exception as e:
-            self.logger.error(f"Error in countdown timer for bot {bot_member.name}: {e}")
+            self.logger.error("Failed to notify moderator %s: %s", moderator.name, e)
+            return False
+        
+    async def _expiry_sweeper(self):
+        """Auto-reject pending bots whose approval timeout has passed"""
+        while True:
+            if not self._expiry_heap:
+                await self._expiry_wakeup.wait()
+                self._expiry_wakeup.clear()
+                continue
+                
+            # Sleep until the earliest deadline, or until a new one is pushed
+            delay = self._expiry_heap[0][0] - time.monotonic()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._expiry_wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                self._expiry_wakeup.clear()
+                continue
+                
+            # Collect every expired bot that is still pending. Entries for bots that were
+            # approved/rejected (or re-added with a new deadline) are stale and skipped.
+            now = time.monotonic()
+            expired = []
+            while self._expiry_heap and self._expiry_heap[0][0] <= now:
+                deadline, bot_id = heapq.heappop(self._expiry_heap)
+                pending_info = self.pending_bots.get(bot_id)
+                if pending_info and pending_info.get('deadline') == deadline:
+                    expired.append(pending_info['member'])
+                    
+            results = await asyncio.gather(
+                *(self.reject_bot(bot_member, "Timeout - no approval received") for bot_member in expired),
+                return_exceptions=True
+            )
+            for bot_member, result in zip(expired, results):
+                if isinstance(result, Exception):
+                    self.logger.error("Error auto-rejecting bot %s: %s", bot_member.name, result)
             
     async def approve_bot(self, bot_member, approved_by):
         """Approve a bot and add to approved list"""
@@ -268,20 +364,17 @@ class SecurityBot(commands.Bot):
         if bot_id not in self.pending_bots:
             return False
             
-        # Cancel countdown timer
-        task = self.pending_bots[bot_id].get('task')
-        if task and not task.done():
-            task.cancel()
-            
         # Remove from pending
-        del self.pending_bots[bot_id]
+        pending_info = self.pending_bots.pop(bot_id)
+        self._forget_messages(pending_info)
         
         # Add to approved list
-        self.approved_bots.add(bot_id)
+        self.approved_bots.add((guild.id, bot_id))
         
         # Log approval
-        self.logger.info(f"Bot {bot_member.name} (ID: {bot_id}) approved by {approved_by.name} in {guild.name}")
-        await self.log_bot_action(bot_member, 'approved', approved_by, "Approved by moderator")
+        self.logger.info("Bot %s (ID: %s) approved by %s in %s", bot_member.name, bot_id, approved_by.name, guild.name)
+        await self.log_bot_action(bot_member, 'approved', approved_by, "Approved by moderator",
+                                  inviter=pending_info.get('inviter'))
         
         # Send confirmation DM
         embed = discord.Embed(
@@ -294,39 +387,34 @@ class SecurityBot(commands.Bot):
         await send_safe_dm(approved_by, embed=embed)
         return True
         
-    async def reject_bot(self, bot_member, reason="Rejected by moderator"):
-        """Reject and kick a bot"""
+    def _forget_messages(self, pending_info):
+        """Drop approval DM lookups for a bot that is no longer pending"""
+        for message_id in pending_info['message_ids']:
+            self._msg_to_bot.pop(message_id, None)
+            
+    async def reject_bot(self, bot_member, reason="Rejected by moderator", moderator=None):
+        """Reject and kick a bot (moderator is None for automatic rejections)"""
         bot_id = bot_member.id
         guild = bot_member.guild
         
-        if bot_id in self.pending_bots:
-            # Cancel countdown timer
-            task = self.pending_bots[bot_id].get('task')
-            if task and not task.done():
-                task.cancel()
-                
-            # Remove from pending
-            del self.pending_bots[bot_id]
+        # Remove from pending
+        pending_info = self.pending_bots.pop(bot_id, None)
+        inviter = None
+        if pending_info:
+            self._forget_messages(pending_info)
+            inviter = pending_info.get('inviter')
             
         try:
             # Kick the bot
             await bot_member.kick(reason=f"Security Bot: {reason}")
-            self.logger.info(f"Bot {bot_member.name} (ID: {bot_id}) kicked from {guild.name} - {reason}")
+            self.logger.info("Bot %s (ID: %s) kicked from %s - %s", bot_member.name, bot_id, guild.name, reason)
             
             # Log the rejection/kick
             action_type = 'auto_kicked' if 'Timeout' in reason else 'rejected'
-            moderator = None
-            if 'Rejected by' in reason:
-                moderator_name = reason.split('Rejected by ')[1]
-                # Try to find the moderator user object
-                for member in guild.members:
-                    if member.name == moderator_name:
-                        moderator = member
-                        break
-            await self.log_bot_action(bot_member, action_type, moderator, reason)
+            await self.log_bot_action(bot_member, action_type, moderator, reason, inviter=inviter)
             
         except discord.Forbidden:
-            self.logger.error(f"Permission denied: Cannot kick bot {bot_member.name}. Bot needs 'Kick Members' permission.")
+            self.logger.error("Permission denied: Cannot kick bot %s. Bot needs 'Kick Members' permission.", bot_member.name)
             
             # Try to notify moderators about the permission issue
             embed = discord.Embed(
@@ -344,64 +432,50 @@ class SecurityBot(commands.Bot):
                     pass
                     
         except discord.NotFound:
-            self.logger.warning(f"Bot {bot_member.name} not found (may have already left)")
+            self.logger.warning("Bot %s not found (may have already left)", bot_member.name)
         except Exception as e:
-            self.logger.error(f"Error kicking bot {bot_member.name}: {e}")
+            self.logger.error("Error kicking bot %s: %s", bot_member.name, e)
             
     async def on_reaction_add(self, reaction, user):
         """Handle moderator reactions to approval messages"""
         if user.bot:
             return
             
+        # Only approve/reject reactions are relevant
+        emoji = str(reaction.emoji)
+        if emoji not in _APPROVAL_EMOJIS:
+            return
+            
         # Check if reaction is on a DM
         if not isinstance(reaction.message.channel, discord.DMChannel):
             return
             
-        # Check if user has the target role in any guild where bot is present
-        has_target_role = False
-        for guild in self.guilds:
-            member = guild.get_member(user.id)
-            if member and is_moderator(member):
-                has_target_role = True
-                break
-                
-        if not has_target_role:
+        # Check if this is a response to a bot approval request
+        bot_id = self._msg_to_bot.get(reaction.message.id)
+        if bot_id is None:
             return
             
-        # Check if this is a response to a bot approval request
-        if reaction.message.embeds:
-            embed = reaction.message.embeds[0]
-            if "New Bot Detected" in embed.title:
-                # Extract bot ID from embed
-                bot_id = None
-                for field in embed.fields:
-                    if "Bot Information" in field.name and "ID:" in field.value:
-                        try:
-                            lines = field.value.split('\n')
-                            for line in lines:
-                                if line.startswith("**ID:**"):
-                                    bot_id = int(line.split('**ID:** ')[1])
-                                    break
-                        except (ValueError, IndexError):
-                            continue
-                            
-                if bot_id and bot_id in self.pending_bots:
-                    pending_info = self.pending_bots[bot_id]
-                    bot_member = pending_info['member']
-                    
-                    # Check if user can moderate this bot's guild
-                    guild = self.get_guild(pending_info['guild_id'])
-                    if guild:
-                        member = guild.get_member(user.id)
-                        if member and is_moderator(member):
-                            if str(reaction.emoji) == "✅":
-                                await self.approve_bot(bot_member, user)
-                            elif str(reaction.emoji) == "❌":
-                                await self.reject_bot(bot_member, f"Rejected by {user.name}")
+        pending_info = self.pending_bots.get(bot_id)
+        if not pending_info:
+            return
+            
+        # Check if user can moderate this bot's guild
+        guild = self.get_guild(pending_info['guild_id'])
+        member = guild.get_member(user.id) if guild else None
+        if not (member and is_moderator(member)):
+            return
+            
+        bot_member = pending_info['member']
+        if emoji == APPROVE_EMOJI:
+            await self.approve_bot(bot_member, user)
+        else:
+            await self.reject_bot(bot_member, f"Rejected by {user.name}", moderator=user)
 
-# Add the commands as separate functions that can be properly registered
-async def bot_status_command(bot, ctx):
+# Commands are module-level Command objects; the bot instance comes from ctx.bot
+@commands.command(name='botstatus')
+async def bot_status_command(ctx):
     """Show current bot approval status"""
+    bot = ctx.bot
     if not is_moderator(ctx.author):
         await ctx.send("❌ You don't have permission to use this command.")
         return
@@ -425,8 +499,8 @@ async def bot_status_command(bot, ctx):
         pending_info = []
         for bot_id, info in bot.pending_bots.items():
             bot_member = info['member']
-            elapsed = (datetime.now(timezone.utc) - info['start_time']).seconds
-            remaining = max(0, BotConfig.APPROVAL_TIMEOUT - elapsed)
+            elapsed = time.monotonic() - info['start_monotonic']
+            remaining = max(0, int(APPROVAL_TIMEOUT - elapsed))
             pending_info.append(f"• {bot_member.name} (ID: {bot_id}) - {remaining}s remaining")
             
         embed.add_field(
@@ -437,8 +511,10 @@ async def bot_status_command(bot, ctx):
         
     await ctx.send(embed=embed)
 
-async def manual_approve_command(bot, ctx, bot_id: int):
+@commands.command(name='approve')
+async def manual_approve_command(ctx, bot_id: int):
     """Manually approve a bot by ID"""
+    bot = ctx.bot
     if not is_moderator(ctx.author):
         await ctx.send("❌ You don't have permission to use this command.")
         return
@@ -452,21 +528,25 @@ async def manual_approve_command(bot, ctx, bot_id: int):
     else:
         await ctx.send("❌ Bot not found in pending list.")
 
-async def manual_reject_command(bot, ctx, bot_id: int):
+@commands.command(name='reject')
+async def manual_reject_command(ctx, bot_id: int):
     """Manually reject a bot by ID"""
+    bot = ctx.bot
     if not is_moderator(ctx.author):
         await ctx.send("❌ You don't have permission to use this command.")
         return
         
     if bot_id in bot.pending_bots:
         bot_member = bot.pending_bots[bot_id]['member']
-        await bot.reject_bot(bot_member, f"Manually rejected by {ctx.author.name}")
+        await bot.reject_bot(bot_member, f"Manually rejected by {ctx.author.name}", moderator=ctx.author)
         await ctx.send(f"❌ Bot {bot_member.name} has been rejected and kicked.")
     else:
         await ctx.send("❌ Bot not found in pending list.")
 
-async def view_logs_command(bot, ctx, limit: int = 20):
+@commands.command(name='logs')
+async def view_logs_command(ctx, limit: int = 20):
     """View recent bot addition/rejection logs"""
+    bot = ctx.bot
     if not is_moderator(ctx.author):
         await ctx.send("❌ You don't have permission to use this command.")
         return
@@ -475,9 +555,11 @@ async def view_logs_command(bot, ctx, limit: int = 20):
         limit = 50  # Limit to prevent spam
         
     try:
-        # Get recent logs
-        logs = await db.get_recent_logs(ctx.guild.id, limit)
-        stats = await db.get_stats(ctx.guild.id)
+        # Get recent logs and stats concurrently (separate pool connections)
+        logs, stats = await asyncio.gather(
+            db.get_recent_logs(ctx.guild.id, limit),
+            db.get_stats(ctx.guild.id)
+        )
         
         if not logs:
             embed = discord.Embed(
@@ -547,17 +629,20 @@ async def view_logs_command(bot, ctx, limit: int = 20):
         await ctx.send(embed=embed)
         
     except Exception as e:
-        bot.logger.error(f"Error retrieving logs: {e}")
+        bot.logger.error("Error retrieving logs: %s", e)
         await ctx.send("❌ Error retrieving logs. Please try again later.")
 
-async def bot_history_command(bot, ctx, bot_id: int):
+@commands.command(name='bothistory')
+async def bot_history_command(ctx, bot_id: int):
     """View action history for a specific bot"""
+    bot = ctx.bot
     if not is_moderator(ctx.author):
         await ctx.send("❌ You don't have permission to use this command.")
         return
         
     try:
-        history = await db.get_bot_history(bot_id)
+        history_limit = 100
+        history = await db.get_bot_history(bot_id, limit=history_limit)
         
         if not history:
             await ctx.send(f"❌ No history found for bot ID: {bot_id}")
@@ -602,41 +687,32 @@ async def bot_history_command(bot, ctx, bot_id: int):
             
             history_entries.append(history_entry)
         
+        # A full page means older entries were cut off by the query limit
+        entry_count = f"{len(history_entries)}+" if len(history) >= history_limit else str(len(history_entries))
+        
         embed.add_field(
-            name=f"📜 Action History ({len(history_entries)} entries)",
+            name=f"📜 Action History ({entry_count} entries)",
             value='\n\n'.join(history_entries[:5]),  # Show last 5 entries
             inline=False
         )
         
         if len(history_entries) > 5:
-            embed.set_footer(text=f"Showing 5 most recent of {len(history_entries)} total entries")
+            embed.set_footer(text=f"Showing 5 most recent of {entry_count} entries")
         
         await ctx.send(embed=embed)
         
     except Exception as e:
-        bot.logger.error(f"Error retrieving bot history: {e}")
+        bot.logger.error("Error retrieving bot history: %s", e)
         await ctx.send("❌ Error retrieving bot history. Please try again later.")
 
 # Register commands properly
 def setup_commands(bot):
     """Setup bot commands"""
-    
-    @bot.command(name='botstatus')
-    async def botstatus(ctx):
-        await bot_status_command(bot, ctx)
-    
-    @bot.command(name='approve')
-    async def approve(ctx, bot_id: int):
-        await manual_approve_command(bot, ctx, bot_id)
-    
-    @bot.command(name='reject')
-    async def reject(ctx, bot_id: int):
-        await manual_reject_command(bot, ctx, bot_id)
-    
-    @bot.command(name='logs')
-    async def logs(ctx, limit: int = 20):
-        await view_logs_command(bot, ctx, limit)
-    
-    @bot.command(name='bothistory')
-    async def bothistory(ctx, bot_id: int):
-        await bot_history_command(bot, ctx, bot_id)
\ No newline at end of file
+    for command in (
+        bot_status_command,
+        manual_approve_command,
+        manual_reject_command,
+        view_logs_command,
+        bot_history_command
+    ):
+        bot.add_command(command)
@@ -5,18 +5,25 @@ Advanced configuration management with environment variable support
 """
 
 import os
+from typing import Final
+
+# Frequently read settings, evaluated once at import. Hot paths import these
+# names directly; BotConfig exposes the same values for everything else.
+COMMAND_PREFIX: Final[str] = os.getenv('COMMAND_PREFIX', '!')
+APPROVAL_TIMEOUT: Final[int] = int(os.getenv('APPROVAL_TIMEOUT', '10'))  # seconds
+TARGET_ROLE_ID: Final[int] = int(os.getenv('TARGET_ROLE_ID', '1266706345571258390'))
 
 class BotConfig:
     """Configuration class for the Discord Security Bot"""
     
     # Bot settings
-    COMMAND_PREFIX = os.getenv('COMMAND_PREFIX', '!')
+    COMMAND_PREFIX = COMMAND_PREFIX
     
     # Approval system settings
-    APPROVAL_TIMEOUT = int(os.getenv('APPROVAL_TIMEOUT', '10'))  # seconds
+    APPROVAL_TIMEOUT = APPROVAL_TIMEOUT  # seconds
     
     # Target role ID for notifications
-    TARGET_ROLE_ID = int(os.getenv('TARGET_ROLE_ID', '1266706345571258390'))
+    TARGET_ROLE_ID = TARGET_ROLE_ID
     
     # Role-based permissions
     MODERATOR_ROLES = [
@@ -36,6 +43,11 @@ class BotConfig:
     LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
     LOG_FILE = os.getenv('LOG_FILE', 'bot.log')
     
+    # Database action-log batching
+    LOG_BATCH_SIZE = int(os.getenv('LOG_BATCH_SIZE', '128'))  # rows per INSERT
+    LOG_FLUSH_INTERVAL = float(os.getenv('LOG_FLUSH_INTERVAL', '0.5'))  # seconds
+    STATS_REFRESH_INTERVAL = int(os.getenv('STATS_REFRESH_INTERVAL', '300'))  # seconds
+    
     # Bot permissions required
     REQUIRED_BOT_PERMISSIONS = [
         'send_messages',
@@ -10,14 +10,95 @@ import asyncio
 import asyncpg
 import logging
 from datetime import datetime, timezone
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Tuple
+from config import BotConfig
 
 logger = logging.getLogger(__name__)
 
+# Columns written per action, in INSERT/COPY parameter order
+BOT_ACTION_COLUMNS = (
+    'action_type', 'bot_id', 'bot_name', 'guild_id', 'guild_name',
+    'moderator_id', 'moderator_name', 'invited_by_id', 'invited_by_name',
+    'reason', 'bot_permissions', 'account_age_days'
+)
+
+# Batches at least this large are written with COPY instead of INSERT
+COPY_THRESHOLD = 32
+
+# Seconds allowed for schema DDL and materialized view refreshes, which can
+# outlast the pool's 10 s command_timeout on a large table. asyncpg treats
+# timeout=None as "use command_timeout", so this has to be an explicit value.
+DDL_TIMEOUT = 3600
+
+# Lower bound of the partial "recent rows" index. Postgres can't match a NOW()
+# predicate against a partial index, so queries repeat this literal next to
+# their NOW() filter. Bump it periodically to keep the index small; it must
+# stay more than 24 hours in the past. The index is named after the cutoff, so
+# create_tables builds a fresh one on the next start and drops the old one.
+RECENT_INDEX_CUTOFF = '2026-10-01'
+RECENT_INDEX_NAME = f"idx_bot_actions_recent_{RECENT_INDEX_CUTOFF.replace('-', '')}"
+
+# Hot queries. asyncpg caches prepared statements per pooled connection keyed
+# on the exact query text, so each is parsed/planned once per connection.
+SQL_INSERT = '''
+    INSERT INTO bot_actions (
+        action_type, bot_id, bot_name, guild_id, guild_name,
+        moderator_id, moderator_name, invited_by_id, invited_by_name,
+        reason, bot_permissions, account_age_days
+    ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12)
+'''
+
+# Only the columns the !logs / !bothistory embeds render
+SQL_RECENT = '''
+    SELECT action_type, bot_name, moderator_name, invited_by_name, timestamp
+    FROM bot_actions 
+    WHERE guild_id = $1 
+    ORDER BY timestamp DESC 
+    LIMIT $2
+'''
+
+SQL_HISTORY = '''
+    SELECT action_type, bot_name, moderator_name, invited_by_name, reason,
+           timestamp, bot_permissions, account_age_days
+    FROM bot_actions 
+    WHERE bot_id = $1 
+    ORDER BY timestamp DESC
+    LIMIT $2
+'''
+
+# Lifetime counts come from the materialized view (up to one refresh interval
+# stale); the last 24 hours are counted live
+SQL_STATS = f'''
+    SELECT 
+        mv.total_actions,
+        mv.approved_count,
+        mv.rejected_count,
+        mv.auto_kicked_count,
+        mv.detected_count,
+        recent.recent_total,
+        recent.recent_approved,
+        recent.recent_rejected,
+        recent.recent_auto_kicked
+    FROM (
+        SELECT 
+            COUNT(*) as recent_total,
+            COUNT(*) FILTER (WHERE action_type = 'approved') as recent_approved,
+            COUNT(*) FILTER (WHERE action_type = 'rejected') as recent_rejected,
+            COUNT(*) FILTER (WHERE action_type = 'auto_kicked') as recent_auto_kicked
+        FROM bot_actions 
+        WHERE guild_id = $1 
+          AND timestamp > NOW() - INTERVAL '24 hours'
+          AND timestamp > '{RECENT_INDEX_CUTOFF}'::timestamptz
+    ) recent
+    LEFT JOIN mv_bot_action_stats mv ON mv.guild_id = $1
+'''
+
 class BotDatabase:
     def __init__(self):
         self.pool: Optional[asyncpg.Pool] = None
         self.database_url = os.getenv('DATABASE_URL')
+        self._queue: asyncio.Queue = asyncio.Queue()  # INSERT parameter tuples; None stops the flusher
+        self._flusher_task: Optional[asyncio.Task] = None
         
     async def initialize(self):
         """Initialize database connection and create tables"""
@@ -25,13 +106,35 @@ class BotDatabase:
             logger.error("DATABASE_URL not found in environment variables")
             return False
             
+        # on_ready fires again on every reconnect; keep the existing pool
+        if self.pool:
+            return True
+            
         try:
-            self.pool = await asyncpg.create_pool(self.database_url)
+            # Bursty workload: few idle backends, headroom for invite storms,
+            # and room in the statement cache for the SQL_* queries
+            self.pool = await asyncpg.create_pool(
+                self.database_url,
+                min_size=2,
+                max_size=32,
+                max_inactive_connection_lifetime=300,
+                statement_cache_size=256,
+                command_timeout=10
+            )
             await self.create_tables()
+            
+            # Start batched action-log writer (a failed first attempt may be retried)
+            if self._flusher_task is None:
+                self._flusher_task = asyncio.create_task(self._flush_loop())
+                
             logger.info("Database initialized successfully")
             return True
         except Exception as e:
             logger.error(f"Failed to initialize database: {e}")
+            # Without the flusher, log_bot_action must see no pool and refuse to queue
+            if self.pool:
+                await self.pool.close()
+                self.pool = None
             return False
             
     async def create_tables(self):
@@ -54,85 +157,187 @@ class BotDatabase:
                     bot_permissions BIGINT,
                     account_age_days INTEGER
                 )
-            ''')
+            ''', timeout=DDL_TIMEOUT)
             
             # Create index for faster queries
             await conn.execute('''
                 CREATE INDEX IF NOT EXISTS idx_bot_actions_guild_timestamp 
                 ON bot_actions(guild_id, timestamp DESC)
-            ''')
+            ''', timeout=DDL_TIMEOUT)
+            
+            # Serves get_bot_history's lookup and ORDER BY without a sort
+            await conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_bot_actions_bot_time 
+                ON bot_actions(bot_id, timestamp DESC)
+            ''', timeout=DDL_TIMEOUT)
             
+            # Serves get_approved_bots at startup without scanning the whole log
             await conn.execute('''
-                CREATE INDEX IF NOT EXISTS idx_bot_actions_bot_id 
-                ON bot_actions(bot_id)
-            ''')
+                CREATE INDEX IF NOT EXISTS idx_bot_actions_approved 
+                ON bot_actions(guild_id, bot_id) WHERE action_type = 'approved'
+            ''', timeout=DDL_TIMEOUT)
+            
+            # Superseded by idx_bot_actions_bot_time
+            await conn.execute('DROP INDEX CONCURRENTLY IF EXISTS idx_bot_actions_bot_id', timeout=DDL_TIMEOUT)
+            
+            # Drop recent-row indexes for older cutoffs, and any left INVALID by
+            # a failed CONCURRENTLY build (IF NOT EXISTS would skip it forever)
+            stale_indexes = await conn.fetch('''
+                SELECT c.relname
+                FROM pg_index i
+                JOIN pg_class c ON c.oid = i.indexrelid
+                WHERE i.indrelid = 'bot_actions'::regclass
+                  AND starts_with(c.relname, 'idx_bot_actions_recent')
+                  AND (c.relname <> $1 OR NOT i.indisvalid)
+            ''', RECENT_INDEX_NAME)
+            for row in stale_indexes:
+                await conn.execute(
+                    f'DROP INDEX CONCURRENTLY IF EXISTS "{row["relname"]}"', timeout=DDL_TIMEOUT
+                )
+            
+            # Partial index covering only the hot tail used by the 24h stats
+            await conn.execute(f'''
+                CREATE INDEX CONCURRENTLY IF NOT EXISTS {RECENT_INDEX_NAME} 
+                ON bot_actions(guild_id, timestamp DESC) INCLUDE (action_type)
+                WHERE timestamp > '{RECENT_INDEX_CUTOFF}'::timestamptz
+            ''', timeout=DDL_TIMEOUT)
+            
+            # Lifetime per-guild counters, refreshed periodically by refresh_stats
+            await conn.execute('''
+                CREATE MATERIALIZED VIEW IF NOT EXISTS mv_bot_action_stats AS
+                SELECT 
+                    guild_id,
+                    COUNT(*) as total_actions,
+                    COUNT(*) FILTER (WHERE action_type = 'approved') as approved_count,
+                    COUNT(*) FILTER (WHERE action_type = 'rejected') as rejected_count,
+                    COUNT(*) FILTER (WHERE action_type = 'auto_kicked') as auto_kicked_count,
+                    COUNT(*) FILTER (WHERE action_type = 'detected') as detected_count
+                FROM bot_actions 
+                GROUP BY guild_id
+            ''', timeout=DDL_TIMEOUT)
+            
+            # Unique index is required for REFRESH ... CONCURRENTLY
+            await conn.execute('''
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_bot_action_stats_guild 
+                ON mv_bot_action_stats(guild_id)
+            ''', timeout=DDL_TIMEOUT)
             
     async def log_bot_action(self, action_data: Dict):
-        """Log a bot action to the database"""
+        """
+        Queue a bot action for logging
+        
+        Returns immediately; the background flusher writes queued actions
+        every LOG_BATCH_SIZE rows or LOG_FLUSH_INTERVAL seconds.
+        """
         if not self.pool:
             logger.warning("Database not initialized, cannot log action")
             return
             
+        self._queue.put_nowait(self._action_args(action_data))
+        
+    async def _flush_loop(self):
+        """Write queued action logs every LOG_BATCH_SIZE rows or LOG_FLUSH_INTERVAL seconds"""
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            record = await self._queue.get()
+            if record is None:
+                return
+            records = [record]
+            deadline = loop.time() + BotConfig.LOG_FLUSH_INTERVAL
+            while len(records) < BotConfig.LOG_BATCH_SIZE:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    record = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if record is None:
+                    # close() asked us to stop; write what we have first
+                    stopping = True
+                    break
+                records.append(record)
+            await self._write_records(records)
+                
+    async def _write_records(self, records: List[tuple]):
+        """
+        Insert INSERT-parameter tuples in a single transaction
+        
+        The transaction commits with synchronous_commit off, so Postgres
+        acknowledges it before the WAL is flushed. An OS/database crash can
+        lose the last few hundred milliseconds of action logs; that is an
+        acceptable trade for audit rows, and never corrupts the table.
+        """
+        if not records:
+            return
+            
+        if not self.pool:
+            logger.warning(f"Database not initialized, dropping {len(records)} queued actions")
+            return
+            
         try:
             async with self.pool.acquire() as conn:
-                await conn.execute('''
-                    INSERT INTO bot_actions (
-                        action_type, bot_id, bot_name, guild_id, guild_name,
-                        moderator_id, moderator_name, invited_by_id, invited_by_name,
-                        reason, bot_permissions, account_age_days
-                    ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12)
-                ''', 
-                action_data.get('action_type'),
-                action_data.get('bot_id'),
-                action_data.get('bot_name'),
-                action_data.get('guild_id'),
-                action_data.get('guild_name'),
-                action_data.get('moderator_id'),
-                action_data.get('moderator_name'),
-                action_data.get('invited_by_id'),
-                action_data.get('invited_by_name'),
-                action_data.get('reason'),
-                action_data.get('bot_permissions'),
-                action_data.get('account_age_days')
-                )
+                async with conn.transaction():
+                    await conn.execute("SET LOCAL synchronous_commit TO OFF")
+                    if len(records) >= COPY_THRESHOLD:
+                        # COPY streams rows without per-row parse/bind
+                        await conn.copy_records_to_table(
+                            'bot_actions', records=records, columns=BOT_ACTION_COLUMNS
+                        )
+                    else:
+                        await conn.executemany(SQL_INSERT, records)
         except Exception as e:
-            logger.error(f"Failed to log bot action: {e}")
+            logger.error(f"Failed to log {len(records)} bot actions: {e}")
             
-    async def get_recent_logs(self, guild_id: int, limit: int = 20) -> List[Dict]:
-        """Get recent bot actions for a guild"""
-        if not self.pool:
+    @staticmethod
+    def _action_args(action_data: Dict) -> tuple:
+        """Convert an action dict into INSERT/COPY parameters (missing keys become None)"""
+        return tuple(map(action_data.get, BOT_ACTION_COLUMNS))
+            
+    async def get_recent_logs(self, guild_id: int, limit: int = 20) -> List[asyncpg.Record]:
+        """Get recent bot actions for a guild (Records support row['column'] access)"""
+        if not self.pool or limit <= 0:
             return []
             
         try:
             async with self.pool.acquire() as conn:
-                rows = await conn.fetch('''
-                    SELECT * FROM bot_actions 
-                    WHERE guild_id = $1 
-                    ORDER BY timestamp DESC 
-                    LIMIT $2
-                ''', guild_id, limit)
+                rows = await conn.fetch(SQL_RECENT, guild_id, limit)
                 
-                return [dict(row) for row in rows]
+                return rows
         except Exception as e:
             logger.error(f"Failed to get recent logs: {e}")
             return []
             
-    async def get_bot_history(self, bot_id: int) -> List[Dict]:
-        """Get action history for a specific bot"""
+    async def get_bot_history(self, bot_id: int, limit: int = 100) -> List[asyncpg.Record]:
+        """Get up to `limit` most recent actions for a specific bot (Records support row['column'] access)"""
+        if not self.pool or limit <= 0:
+            return []
+            
+        try:
+            async with self.pool.acquire() as conn:
+                rows = await conn.fetch(SQL_HISTORY, bot_id, limit)
+                
+                return rows
+        except Exception as e:
+            logger.error(f"Failed to get bot history: {e}")
+            return []
+            
+    async def get_approved_bots(self) -> List[Tuple[int, int]]:
+        """Get (guild_id, bot_id) for every bot that has ever been approved, per guild"""
         if not self.pool:
             return []
             
         try:
             async with self.pool.acquire() as conn:
                 rows = await conn.fetch('''
-                    SELECT * FROM bot_actions 
-                    WHERE bot_id = $1 
-                    ORDER BY timestamp DESC
-                ''', bot_id)
+                    SELECT DISTINCT guild_id, bot_id FROM bot_actions 
+                    WHERE action_type = 'approved'
+                ''')
                 
-                return [dict(row) for row in rows]
+                return [(row['guild_id'], row['bot_id']) for row in rows]
         except Exception as e:
-            logger.error(f"Failed to get bot history: {e}")
+            logger.error(f"Failed to load approved bots, previously approved bots will need re-approval: {e}")
             return []
             
     async def get_stats(self, guild_id: int) -> Dict:
@@ -142,28 +347,7 @@ class BotDatabase:
             
         try:
             async with self.pool.acquire() as conn:
-                # Get total counts
-                stats = await conn.fetchrow('''
-                    SELECT 
-                        COUNT(*) as total_actions,
-                        COUNT(*) FILTER (WHERE action_type = 'approved') as approved_count,
-                        COUNT(*) FILTER (WHERE action_type = 'rejected') as rejected_count,
-                        COUNT(*) FILTER (WHERE action_type = 'auto_kicked') as auto_kicked_count,
-                        COUNT(*) FILTER (WHERE action_type = 'detected') as detected_count
-                    FROM bot_actions 
-                    WHERE guild_id = $1
-                ''', guild_id)
-                
-                # Get recent activity (last 24 hours)
-                recent_stats = await conn.fetchrow('''
-                    SELECT 
-                        COUNT(*) as recent_total,
-                        COUNT(*) FILTER (WHERE action_type = 'approved') as recent_approved,
-                        COUNT(*) FILTER (WHERE action_type = 'rejected') as recent_rejected,
-                        COUNT(*) FILTER (WHERE action_type = 'auto_kicked') as recent_auto_kicked
-                    FROM bot_actions 
-                    WHERE guild_id = $1 AND timestamp > NOW() - INTERVAL '24 hours'
-                ''', guild_id)
+                stats = await conn.fetchrow(SQL_STATS, guild_id)
                 
                 return {
                     'total_actions': stats['total_actions'] or 0,
@@ -171,19 +355,45 @@ class BotDatabase:
                     'rejected_count': stats['rejected_count'] or 0,
                     'auto_kicked_count': stats['auto_kicked_count'] or 0,
                     'detected_count': stats['detected_count'] or 0,
-                    'recent_total': recent_stats['recent_total'] or 0,
-                    'recent_approved': recent_stats['recent_approved'] or 0,
-                    'recent_rejected': recent_stats['recent_rejected'] or 0,
-                    'recent_auto_kicked': recent_stats['recent_auto_kicked'] or 0
+                    'recent_total': stats['recent_total'] or 0,
+                    'recent_approved': stats['recent_approved'] or 0,
+                    'recent_rejected': stats['recent_rejected'] or 0,
+                    'recent_auto_kicked': stats['recent_auto_kicked'] or 0
                 }
         except Exception as e:
             logger.error(f"Failed to get stats: {e}")
             return {}
             
+    async def refresh_stats(self):
+        """Refresh the lifetime stats materialized view without blocking readers"""
+        if not self.pool:
+            return
+            
+        try:
+            async with self.pool.acquire() as conn:
+                await conn.execute(
+                    'REFRESH MATERIALIZED VIEW CONCURRENTLY mv_bot_action_stats', timeout=DDL_TIMEOUT
+                )
+        except Exception as e:
+            logger.error(f"Failed to refresh stats: {e}")
+            
     async def close(self):
-        """Close database connection"""
+        """Flush queued action logs and close database connection"""
+        if self._flusher_task is not None:
+            # None is the stop sentinel; awaiting lets an in-flight write finish
+            self._queue.put_nowait(None)
+            await self._flusher_task
+            self._flusher_task = None
+            
+        # Drain anything queued after the last flush
+        records = []
+        while not self._queue.empty():
+            records.append(self._queue.get_nowait())
+        await self._write_records(records)
+        
         if self.pool:
             await self.pool.close()
+            self.pool = None
 
 # Global database instance
 db = BotDatabase()
\ No newline at end of file
@@ -9,22 +9,44 @@ with PostgreSQL logging and advanced security features
 import asyncio
 import logging
 import os
+import queue
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
 from dotenv import load_dotenv
-from bot_fixed import SecurityBot, setup_commands
 
-# Load environment variables
+# Load environment variables before the project modules read them at import
 load_dotenv()
 
+from bot_fixed import SecurityBot, setup_commands
+from config import BotConfig
+
+# Background thread that performs the actual log file/console writes
+log_listener: Optional[QueueListener] = None
+
 def setup_logging():
-    """Configure logging for the application"""
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler('bot.log'),
-            logging.StreamHandler()
-        ]
-    )
+    """
+    Configure logging for the application
+    
+    Log calls only enqueue the record; a QueueListener thread does the file
+    and console I/O so the event loop never blocks on write().
+    """
+    global log_listener
+    
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    handlers = [
+        logging.FileHandler('bot.log'),
+        logging.StreamHandler()
+    ]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+        
+    log_queue = queue.SimpleQueue()
+    log_listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    log_listener.start()
+    
+    root = logging.getLogger()
+    root.setLevel(getattr(logging, BotConfig.LOG_LEVEL.upper(), logging.INFO))
+    root.addHandler(QueueHandler(log_queue))
 
 async def main():
     """Main entry point for the Discord security bot"""
@@ -54,4 +76,9 @@ async def main():
             await bot.close()
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    try:
+        asyncio.run(main())
+    finally:
+        # Flush queued log records before exiting
+        if log_listener:
+            log_listener.stop()
@@ -4,31 +4,106 @@ Created by: spice.efx
 Advanced helper functions for permissions, secure messaging, and validation
 """
 
+import functools
 import logging
+import time
 import discord
-from typing import List, Optional
-from config import BotConfig
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from config import TARGET_ROLE_ID
 
 logger = logging.getLogger(__name__)
 
+_UTC = timezone.utc
+
+# Permissions that make a bot dangerous, and their bits precomputed for check_bot_safety
+_DANGEROUS_PERMS: Tuple[str, ...] = (
+    'administrator',
+    'manage_guild',
+    'manage_roles',
+    'manage_channels',
+    'kick_members',
+    'ban_members',
+    'manage_webhooks'
+)
+DANGEROUS_BITS: Tuple[Tuple[int, str], ...] = tuple(
+    (discord.Permissions(**{name: True}).value, name) for name in _DANGEROUS_PERMS
+)
+DANGEROUS_MASK = discord.Permissions(**dict.fromkeys(_DANGEROUS_PERMS, True)).value
+
+@dataclass(slots=True, frozen=True)
+class BotInfo:
+    """Display information about a bot member (see format_bot_info)"""
+    name: str
+    id: int
+    discriminator: str
+    created_at: datetime
+    joined_at: Optional[datetime]
+    avatar_url: str
+    guild: str
+    guild_id: int
+
+@dataclass(slots=True, frozen=True)
+class AuditEntry:
+    """Audit log record for a bot action (see create_audit_log_entry)"""
+    timestamp: str
+    action: str
+    bot_id: int
+    bot_name: str
+    guild_id: int
+    guild_name: str
+    moderator_id: int
+    moderator_name: str
+    reason: str
+
+# (guild_id, member_id) -> (checked_at, is_moderator)
+_mod_cache: Dict[Tuple[int, int], Tuple[float, bool]] = {}
+_MOD_CACHE_TTL = 5  # seconds; also bounds staleness from role permission edits
+_MOD_CACHE_SWEEP_EVERY = 1000  # inserts between expired-entry sweeps
+_mod_cache_inserts = 0
+
 def is_moderator(member: discord.Member) -> bool:
     """
     Check if a member has the specific target role
     
+    Results are cached per (guild, member) for a short TTL; call
+    clear_moderator_cache when the member's roles change.
+    
     Args:
         member: Discord member to check
         
     Returns:
         bool: True if member has the target role
     """
+    global _mod_cache_inserts
+    
     if not member:
         return False
     
-    # Check if member has the specific target role
-    target_role_id = BotConfig.TARGET_ROLE_ID
-    target_role = member.guild.get_role(target_role_id)
+    key = (member.guild.id, member.id)
+    now = time.monotonic()
+    cached = _mod_cache.get(key)
+    if cached and now - cached[0] < _MOD_CACHE_TTL:
+        return cached[1]
+    
+    result = _check_moderator(member)
+    _mod_cache[key] = (now, result)
     
-    if target_role and target_role in member.roles:
+    # Periodically drop expired entries so the cache stays bounded
+    _mod_cache_inserts += 1
+    if _mod_cache_inserts >= _MOD_CACHE_SWEEP_EVERY:
+        _mod_cache_inserts = 0
+        expired = [k for k, (checked_at, _) in _mod_cache.items() if now - checked_at >= _MOD_CACHE_TTL]
+        for k in expired:
+            del _mod_cache[k]
+    
+    return result
+
+def _check_moderator(member: discord.Member) -> bool:
+    """Uncached moderator check used by is_moderator"""
+    # Check if member has the specific target role (ID lookup, doesn't build member.roles)
+    if member.get_role(TARGET_ROLE_ID) is not None:
         return True
         
     # Fallback: Check if member has administrator permission
@@ -37,6 +112,15 @@ def is_moderator(member: discord.Member) -> bool:
         
     return False
 
+def clear_moderator_cache(member: discord.Member):
+    """
+    Forget the cached is_moderator result for a member
+    
+    Args:
+        member: Discord member whose roles changed
+    """
+    _mod_cache.pop((member.guild.id, member.id), None)
+
 async def send_safe_dm(user: discord.User, **kwargs) -> Optional[discord.Message]:
     """
     Safely send a DM to a user with error handling
@@ -60,6 +144,10 @@ async def send_safe_dm(user: discord.User, **kwargs) -> Optional[discord.Message
         logger.error(f"Unexpected error sending DM to {user.name}: {e}")
         return None
 
+# Prebuilt countdown strings for the common 1-60 second range
+_COUNTDOWN_CACHE = {s: f"⏰ {s} seconds remaining" for s in range(2, 61)}
+_COUNTDOWN_CACHE[1] = "⏰ 1 second remaining"
+
 def format_countdown(seconds: int) -> str:
     """
     Format countdown timer for display
@@ -72,12 +160,9 @@ def format_countdown(seconds: int) -> str:
     """
     if seconds <= 0:
         return "⏰ Time's up!"
-    elif seconds == 1:
-        return "⏰ 1 second remaining"
-    else:
-        return f"⏰ {seconds} seconds remaining"
+    return _COUNTDOWN_CACHE.get(seconds) or f"⏰ {seconds} seconds remaining"
 
-def format_bot_info(bot_member: discord.Member) -> dict:
+def format_bot_info(bot_member: discord.Member) -> BotInfo:
     """
     Format bot information for display
     
@@ -85,18 +170,19 @@ def format_bot_info(bot_member: discord.Member) -> dict:
         bot_member: Discord bot member
         
     Returns:
-        dict: Formatted bot information
-    """
-    return {
-        'name': bot_member.name,
-        'id': bot_member.id,
-        'discriminator': bot_member.discriminator,
-        'created_at': bot_member.created_at,
-        'joined_at': bot_member.joined_at,
-        'avatar_url': str(bot_member.display_avatar.url),
-        'guild': bot_member.guild.name,
-        'guild_id': bot_member.guild.id
-    }
+        BotInfo: Formatted bot information (dataclasses.asdict for a dict)
+    """
+    guild = bot_member.guild
+    return BotInfo(
+        name=bot_member.name,
+        id=bot_member.id,
+        discriminator=bot_member.discriminator,
+        created_at=bot_member.created_at,
+        joined_at=bot_member.joined_at,
+        avatar_url=str(bot_member.display_avatar.url),
+        guild=guild.name,
+        guild_id=guild.id
+    )
 
 def validate_bot_permissions(bot_member: discord.Member, required_perms: List[str]) -> tuple[bool, List[str]]:
     """
@@ -110,19 +196,33 @@ def validate_bot_permissions(bot_member: discord.Member, required_perms: List[st
         tuple[bool, List[str]]: (has_all_perms, missing_perms)
     """
     bot_perms = bot_member.guild_permissions
-    missing_perms = []
     
+    # Fast path: a single AND answers the common "has everything" case
+    required_mask = _permissions_mask(tuple(required_perms))
+    if (bot_perms.value & required_mask) == required_mask:
+        return True, []
+    
+    # Slow path: report which permissions are missing (unknown names were
+    # already reported by _permissions_mask)
+    missing_perms = []
     for perm_name in required_perms:
-        if not hasattr(bot_perms, perm_name):
-            logger.warning(f"Unknown permission: {perm_name}")
-            continue
-            
-        if not getattr(bot_perms, perm_name):
+        if perm_name in discord.Permissions.VALID_FLAGS and not getattr(bot_perms, perm_name):
             missing_perms.append(perm_name)
             
     return len(missing_perms) == 0, missing_perms
 
-def create_audit_log_entry(action: str, bot_member: discord.Member, moderator: discord.User, reason: str | None = None) -> dict:
+@functools.lru_cache(maxsize=32)
+def _permissions_mask(perm_names: Tuple[str, ...]) -> int:
+    """Combined permission bits for perm_names (cached; unknown names are skipped)"""
+    mask = 0
+    for name in perm_names:
+        if name not in discord.Permissions.VALID_FLAGS:
+            logger.warning(f"Unknown permission: {name}")
+            continue
+        mask |= discord.Permissions(**{name: True}).value
+    return mask
+
+def create_audit_log_entry(action: str, bot_member: discord.Member, moderator: discord.User, reason: str | None = None) -> AuditEntry:
     """
     Create an audit log entry for bot actions
     
@@ -133,21 +233,20 @@ def create_audit_log_entry(action: str, bot_member: discord.Member, moderator: d
         reason: Optional reason for action
         
     Returns:
-        dict: Audit log entry
-    """
-    from datetime import datetime, timezone
-    
-    return {
-        'timestamp': datetime.now(timezone.utc).isoformat(),
-        'action': action,
-        'bot_id': bot_member.id,
-        'bot_name': bot_member.name,
-        'guild_id': bot_member.guild.id,
-        'guild_name': bot_member.guild.name,
-        'moderator_id': moderator.id,
-        'moderator_name': moderator.name,
-        'reason': reason or 'No reason provided'
-    }
+        AuditEntry: Audit log entry (dataclasses.asdict for a dict)
+    """
+    guild = bot_member.guild
+    return AuditEntry(
+        timestamp=datetime.now(_UTC).isoformat(),
+        action=action,
+        bot_id=bot_member.id,
+        bot_name=bot_member.name,
+        guild_id=guild.id,
+        guild_name=guild.name,
+        moderator_id=moderator.id,
+        moderator_name=moderator.name,
+        reason=reason or 'No reason provided'
+    )
 
 def get_bot_invite_info(bot_member: discord.Member) -> Optional[dict]:
     """
@@ -181,28 +280,22 @@ async def check_bot_safety(bot_member: discord.Member) -> dict:
     Returns:
         dict: Safety check results
     """
+    # Read discord.py descriptors once
+    now = discord.utils.utcnow()
+    flags = bot_member.public_flags
+    perms_val = bot_member.guild_permissions.value
+    
     safety_info = {
-        'is_verified': bot_member.public_flags.verified_bot if hasattr(bot_member.public_flags, 'verified_bot') else False,
-        'account_age_days': (discord.utils.utcnow() - bot_member.created_at).days,
+        'is_verified': getattr(flags, 'verified_bot', False),
+        'account_age_days': (now - bot_member.created_at).days,
         'has_avatar': bot_member.avatar is not None,
-        'permissions_value': bot_member.guild_permissions.value,
+        'permissions_value': perms_val,
         'dangerous_permissions': []
     }
     
-    # Check for potentially dangerous permissions
-    dangerous_perms = [
-        'administrator',
-        'manage_guild',
-        'manage_roles',
-        'manage_channels',
-        'kick_members',
-        'ban_members',
-        'manage_webhooks'
-    ]
-    
-    bot_perms = bot_member.guild_permissions
-    for perm in dangerous_perms:
-        if hasattr(bot_perms, perm) and getattr(bot_perms, perm):
-            safety_info['dangerous_permissions'].append(perm)
+    # Check for potentially dangerous permissions with one AND over the raw bits
+    hit = perms_val & DANGEROUS_MASK
+    if hit:
+        safety_info['dangerous_permissions'] = [name for bit, name in DANGEROUS_BITS if hit & bit]
             
     return safety_info